@@ -9,6 +9,7 @@
 #include <signal.h>
 #include <errno.h>
 #include <sys/types.h>
+#include <sys/stat.h>
 
 /* fsync the file (or directory) at path. Best-effort: returns -1 if the
  * path cannot be opened or the filesystem refuses (some network FSes do);
@@ -29,6 +30,16 @@ int sol_pid_alive(int pid) {
   return errno == EPERM;
 }
 
+/* size and mtime (whole seconds) from ONE stat(2), for the `stat` query:
+ * getFileSize + getModificationTime would stat the path twice. */
+int sol_stat_path(const char *p, long long *size, long long *mtime) {
+  struct stat st;
+  if (stat(p, &st) != 0) return -1;
+  *size = (long long)st.st_size;
+  *mtime = (long long)st.st_mtime;
+  return 0;
+}
+
 int sol_getpid(void) { return (int)getpid(); }
 
 /* crash NOW: no atexit handlers, no Haskell RTS shutdown, no buffered
@@ -181,10 +181,13 @@ mParseRow line = map (fn f -> base.pI f) (base.splitCh 44 line).
 # integer cells; blank lines ignored
 mFromCsv s = mFromRows (map (fn l -> mParseRow l) (mCsvLines s)).
 
-# first line is a header: (headerFields, matrix)
-mFromCsvHeader s | mCsvLines s == [] = ([], mFromRows []).
-mFromCsvHeader s =
-  h :: rest = mCsvLines s;
+# first line is a header: (headerFields, matrix). The input is split into
+# lines ONCE — splitCh is the expensive part, so the empty check must not
+# pay for a second full split.
+mFromCsvHeader s = mCsvHeaderOf (mCsvLines s).
+mCsvHeaderOf lns | lns == [] = ([], mFromRows []).
+mCsvHeaderOf lns =
+  h :: rest = lns;
   (base.splitCh 44 h, mFromRows (map (fn l -> mParseRow l) rest)).
 
 mJoinC xs | xs == [] = "".
@@ -23,6 +23,7 @@ module Bytecode where
 
 import Control.Monad (foldM)
 import Control.Monad.State.Strict
+import Data.Array (Array, elems, listArray)
 import Data.List (foldl')
 import qualified Data.Map.Strict as M
 import Lang (Core (..), Name, Prog)
@@ -31,27 +32,30 @@ type Reg = Int
 
 type Label = Int
 
+-- Register, label, tag and arity fields are strict so GHC unpacks them into
+-- the constructor: each instruction the VM fetches is one flat node, with no
+-- boxed Int or pending thunk to chase per operand.
 data Instr
-  = LoadI Reg Integer
-  | LoadS Reg String
-  | Move Reg Reg
+  = LoadI !Reg !Integer
+  | LoadS !Reg String
+  | Move !Reg !Reg
   | -- arithmetic / comparison band (saturated prim ops become real opcodes)
-    Arith2 ArithOp Reg Reg Reg
+    Arith2 !ArithOp !Reg !Reg !Reg
   | -- control
-    Jmp Label
-  | Jz Reg Label -- jump if reg holds False
-  | LabelI Label -- pseudo-instr, removed by assemble
-  | Call Reg Name [Reg] -- static saturated call: fuel check at entry
-  | Apply Reg Reg Reg -- rd <- apply rf ra   (generic PAP apply)
-  | MkPap Reg Name -- global-as-value (arity known statically)
-  | Ret Reg
+    Jmp !Label
+  | Jz !Reg !Label -- jump if reg holds False
+  | LabelI !Label -- pseudo-instr, removed by assemble
+  | Call !Reg Name [Reg] -- static saturated call: fuel check at entry
+  | Apply !Reg !Reg !Reg -- rd <- apply rf ra   (generic PAP apply)
+  | MkPap !Reg Name -- global-as-value (arity known statically)
+  | Ret !Reg
   | -- data band
-    Mk Reg Int Int [Reg] -- rd <- <tid.var fields>
-  | TagEq Reg Int Int Reg -- rd <- Bool(tag rs == tid.var)
-  | Proj Reg Int Reg -- rd <- field i of rs
+    Mk !Reg !Int !Int [Reg] -- rd <- <tid.var fields>
+  | TagEq !Reg !Int !Int !Reg -- rd <- Bool(tag rs == tid.var)
+  | Proj !Reg !Int !Reg -- rd <- field i of rs
   | ErrI String
   | -- HAL band: the one trap into Haskell (IO, STM file ops, prims)
-    HCall Reg Name [Reg]
+    HCall !Reg Name [Reg]
   deriving (Show)
 
 data ArithOp = OAdd | OSub | OMul | ODiv | OLt | OLe | OGt | OGe | OEq | ONe
@@ -68,7 +72,9 @@ arithOps =
 data Fn = Fn
   { fnArity :: !Int,
     fnSlots :: !Int, -- frame size, computed at compile time
-    fnCode :: [Instr] -- assembled: labels resolved to indices
+    -- assembled: labels resolved to indices. An array so the VM's fetch is
+    -- O(1) — a list made every backward jump re-walk from instruction 0
+    fnCode :: Array Int Instr
   }
 
 type BProg = M.Map Name Fn
@@ -130,7 +136,8 @@ compileProg halArity prog = M.mapWithKey one prog
           st0 = CEnv (length ps) (length ps) env0 0 []
           (r, st) = runState (cExpr ci body) st0
           code = reverse (Ret r : cOut st)
-       in Fn (length ps) (cHigh st) (assemble code)
+          asm = assemble code
+       in Fn (length ps) (cHigh st) (listArray (0, length asm - 1) asm)
 
 cExpr :: CallInfo -> Core -> C Reg
 cExpr ci = go
@@ -243,6 +250,6 @@ disasm :: Name -> Fn -> String
 disasm n (Fn ar slots code) =
   unlines $
     (n ++ " (arity " ++ show ar ++ ", frame " ++ show slots ++ " slots):")
-      : [pad i ++ "  " ++ show ins | (i, ins) <- zip [0 :: Int ..] code]
+      : [pad i ++ "  " ++ show ins | (i, ins) <- zip [0 :: Int ..] (elems code)]
   where
     pad i = let s = show i in replicate (4 - length s) ' ' ++ s
@@ -18,10 +18,11 @@ module Lang where
 import Control.Monad (foldM, unless, void, when)
 import Control.Monad.State.Strict
 import Data.Char (isAlphaNum, isLetter, isLower, isUpper)
+import Data.Containers.ListUtils (nubOrd)
 import Data.List (foldl', intercalate, nub, sort, sortOn)
 import qualified Data.Map.Strict as M
 import qualified Data.Set as S
-import Data.Maybe (fromMaybe)
+import Data.Maybe (fromMaybe, isNothing)
 import Data.Void (Void)
 import Text.Megaparsec
 import Text.Megaparsec.Char
@@ -163,9 +164,11 @@ lowerName = try $ do
     _ -> fail "expected simple lowercase identifier"
 
 pName :: P Name
-pName = try (parens operatorName) <|> lowerName
-  where
-    operatorName = lexeme (some (oneOf "+-*/=!<>|$?"))
+pName = parenOp <|> lowerName
+
+-- `(+)`, `(|>)`: an operator used as a name
+parenOp :: P Name
+parenOp = try (parens (lexeme (some (oneOf "+-*/=!<>|$?"))))
 
 upperName :: P Name
 upperName = try $ do
@@ -224,23 +227,23 @@ opExpr = dollarChain
           SLam ps <$> expr
       )
         <|> cmpLayer
+    -- operator layers read their operator as ONE token: the first char
+    -- picks the family and at most one more char decides it, instead of
+    -- a `try (symbol ...)` per spelling re-reading the same input
     pipeOp =
-      choice
-        [ SBin "|>?" <$ try (symbol "|>?"),
-          SBin "|>" <$ try (symbol "|>"),
-          SBin ">>" <$ try (lexeme (string ">>" <* notFollowedBy (char '=')))
-        ]
+      fmap SBin . lexeme . try $
+        (char '|' *> char '>' *> (("|>?" <$ char '?') <|> pure "|>"))
+          <|> (">>" <$ string ">>" <* notFollowedBy (char '='))
 
     cmpLayer = chainl1' consLayer cmpOp
     cmpOp =
-      choice
-        [ SBin "==" <$ try (symbol "=="),
-          SBin "!=" <$ try (symbol "!="),
-          SBin "<=" <$ try (symbol "<="),
-          SBin ">=" <$ try (symbol ">="),
-          SBin "<" <$ try (lexeme (char '<' <* notFollowedBy (oneOf "="))),
-          SBin ">" <$ try (lexeme (char '>' <* notFollowedBy (oneOf ">=")))
-        ]
+      fmap SBin . lexeme . try $
+        choice
+          [ "==" <$ char '=' <* char '=',
+            "!=" <$ char '!' <* char '=',
+            char '<' *> (("<=" <$ char '=') <|> pure "<"),
+            char '>' *> ((">=" <$ char '=') <|> (">" <$ notFollowedBy (char '>')))
+          ]
 
     consLayer = do
       a <- addLayer
@@ -368,7 +371,9 @@ stringLit = lexeme $ do
       choice
         [ SegExpr <$> (char '{' *> sc *> expr <* char '}'),
           SegStr . pure <$> (char '\\' *> escaped),
-          SegStr . pure <$> satisfy (\c -> c /= '"' && c /= '{' && c /= '\\')
+          -- a whole run of plain characters in one takeWhile1P, not a
+          -- one-char segment per character for mergeSegs to glue back
+          SegStr <$> takeWhile1P Nothing (\c -> c /= '"' && c /= '{' && c /= '\\')
         ]
     escaped =
       choice
@@ -417,7 +422,8 @@ patAtom =
       pure (foldr (\p acc -> PCon "Cons" [p, acc]) (PCon "Nil" []) ps)
     strPat = lexeme $ do
       _ <- char '"'
-      s <- manyTill (satisfy (/= '"')) (char '"')
+      s <- takeWhileP Nothing (/= '"')
+      _ <- char '"'
       pure (PStr s)
     patInParens = try sigParam <|> tupleOrOne
     -- `(s : Functor)` — a value param constrained by a named sig; the
@@ -444,16 +450,35 @@ topDecl :: P STop
 topDecl =
   choice
     [ evalDecl,
-      sigDecl,
-      structDecl,
-      try typeDecl,
-      try shapeAlias,
-      try conAlias,
-      try otherAlias,
+      upperDecl,
       try signature,
       binding
     ]
 
+-- Every declaration headed by an uppercase name: sig, struct, type, shape,
+-- alias, or a signature on a constructor-ish name. The head (name, type
+-- params, `=`) is parsed ONCE and the token after it picks the form, so no
+-- alternative re-lexes a `Name =` prefix only to fail on the keyword.
+upperDecl :: P STop
+upperDecl = do
+  n <- upperName
+  sigTail n <|> defn n
+  where
+    defn n = do
+      mult <- optional integer
+      params <- many lowerName
+      eqSign
+      if isNothing mult && null params
+        then
+          choice
+            [ keyword "Sig" *> sigDecl n,
+              keyword "Struct" *> structDecl n,
+              keyword "Type" *> typeDecl n mult params,
+              shapeAlias n,
+              aliasDecl n
+            ]
+        else keyword "Type" *> typeDecl n mult params
+
 keyword :: String -> P ()
 keyword s = lexeme . try $ void (string s <* notFollowedBy (satisfy identChar))
 
@@ -461,11 +486,8 @@ keyword s = lexeme . try $ void (string s <* notFollowedBy (satisfy identChar))
 -- Uniform declaration form (Ident = Keyword ..., mirroring `N = Type ...`).
 -- A named row: the field names are the signature; the type annotations are
 -- parsed and skipped (same discipline as shapeAlias) until inference lands.
-sigDecl :: P STop
-sigDecl = try $ do
-  n <- upperName
-  eqSign
-  keyword "Sig"
+sigDecl :: Name -> P STop
+sigDecl n = do
   fs <- braces (sigField `sepBy1` symbol ",")
   dotTerm
   pure (TSigDef n fs)
@@ -478,11 +500,8 @@ sigDecl = try $ do
 -- `Num = Struct Arith MathOps { add = fn a b -> a + b, zero = 0 }.`
 -- Implemented sigs are juxtaposed after the keyword (type-argument style);
 -- each is checked (fields must cover the sig's row) at expansion.
-structDecl :: P STop
-structDecl = try $ do
-  n <- upperName
-  eqSign
-  keyword "Struct"
+structDecl :: Name -> P STop
+structDecl n = do
   sigs <- many upperName
   fs <- braces (fieldAssign `sepBy1` symbol ",")
   dotTerm
@@ -500,8 +519,12 @@ evalDecl = do
   pure (TEval e)
 
 signature :: P STop
-signature = do
-  n <- (pName <|> upperName)
+signature = pName >>= sigTail
+
+-- `: ty -> ty.` after a declared name; a signature whose types don't parse
+-- is skipped rather than rejected
+sigTail :: Name -> P STop
+sigTail n = do
   _ <- lexeme (char ':' <* notFollowedBy (char ':'))
   try (fullSig n) <|> (skipTillDot >> pure TSkip)
   where
@@ -543,13 +566,8 @@ tyAtom =
 skipTillDot :: P ()
 skipTillDot = void (skipManyTill anySingle dotTerm)
 
-typeDecl :: P STop
-typeDecl = do
-  n <- upperName
-  mult <- optional integer
-  params <- many lowerName
-  eqSign
-  keyword "Type"
+typeDecl :: Name -> Maybe Integer -> [Name] -> P STop
+typeDecl n mult params = do
   cons <-
     parens (conDecl `sepBy1` pipeSep)
       <|> newtypeCon n
@@ -564,10 +582,8 @@ typeDecl = do
       args <- some tyAtom
       pure [(n, args)]
 
-shapeAlias :: P STop
-shapeAlias = do
-  n <- upperName
-  eqSign
+shapeAlias :: Name -> P STop
+shapeAlias n = do
   fs <- braces (fieldDecl `sepBy1` symbol ",")
   dotTerm
   pure (TShape n fs)
@@ -579,26 +595,18 @@ shapeAlias = do
       pure (f, t)
 
 -- `T = myscript.T.` — alias an imported (module-qualified) constructor/type
--- so it can be used in patterns and signatures under the local name
-conAlias :: P STop
-conAlias = do
-  t <- upperName
-  eqSign
+-- so it can be used in patterns and signatures under the local name.
+-- `T = U.` (an uppercase right-hand side) is accepted and skipped.
+aliasDecl :: Name -> P STop
+aliasDecl t = do
   segs <- dottedIdent
   case segs of
     (s : _ : _) | isLower (head s) -> do
       dotTerm
       pure (TConAlias t (intercalate "." segs))
+    (s : _) | isUpper (head s) -> TSkip <$ dotTerm
     _ -> fail "not a module-qualified alias"
 
-otherAlias :: P STop
-otherAlias = do
-  _ <- upperName
-  eqSign
-  _ <- upperName
-  dotTerm
-  pure TSkip
-
 binding :: P STop
 binding = do
   n <- pName
@@ -621,20 +629,22 @@ block = do
   e <- expr
   pure $ if null stmts then e else SBlock stmts e
   where
-    stmt = try nameStmt <|> patStmt
-    nameStmt = do
-      n <- pName
-      ps <- many lowerName
+    -- one pattern parse serves both statement forms: a bare variable head
+    -- may be a local function (`f x y = e;`), any other pattern is a
+    -- destructuring bind. Only an operator-named local needs its own head.
+    stmt = (parenOp >>= nameStmt) <|> (pattern' >>= fromPat)
+    fromPat (PVar n) = nameStmt n
+    fromPat p = do
       eqSign
       e <- expr
       _ <- symbol ";"
-      pure (SBind n ps e)
-    patStmt = do
-      p <- pattern'
+      pure (SBindPat p e)
+    nameStmt n = do
+      ps <- many lowerName
       eqSign
       e <- expr
       _ <- symbol ";"
-      pure (SBindPat p e)
+      pure (SBind n ps e)
 
 --------------------------------------------------------------------------------
 -- Desugaring
@@ -644,6 +654,7 @@ data DEnv = DEnv
   { dFresh :: Int,
     dCons :: M.Map Name (Int, Int, Int),
     dShapes :: M.Map [Name] Int,
+    dFields :: M.Map Name [(Int, Int)], -- field -> (shape tid, slot), see fieldIndex
     dLifted :: [(Name, [Name], Core)]
   }
 
@@ -714,6 +725,13 @@ collectShapes tops = M.fromList (zip allShapes [100 ..])
     stmtShapes (SBind _ _ x) = exprShapes x
     stmtShapes (SBindPat p x) = patShapes p ++ exprShapes x
 
+-- every field name to the shapes carrying it and its slot in each (fields
+-- are laid out in sorted order). Built once per program so a projection is
+-- one lookup rather than a scan of every shape.
+fieldIndex :: M.Map [Name] Int -> M.Map Name [(Int, Int)]
+fieldIndex shapes =
+  M.fromListWith (flip (++)) [(f, [(tid, idx)]) | (fs, tid) <- M.toList shapes, (f, idx) <- zip fs [0 ..]]
+
 dExpr :: SExpr -> D Core
 dExpr = \case
   SVar n -> do
@@ -805,8 +823,7 @@ shapeId fs = do
 
 projField :: Core -> Name -> D Core
 projField scrut f = do
-  shapes <- gets dShapes
-  let cands = [(tid, idx) | (fs, tid) <- M.toList shapes, f `elem` fs, let idx = length (takeWhile (/= f) (sort fs))]
+  cands <- gets (M.findWithDefault [] f . dFields)
   case cands of
     [] -> error ("no record shape has field ." ++ f)
     [(_, idx)] -> pure (CProj idx scrut)
@@ -818,10 +835,13 @@ projField scrut f = do
 updateRecord :: Core -> [([Name], SExpr)] -> D Core
 updateRecord scrut assigns = do
   shapes <- gets dShapes
-  let roots = nub (map (head . fst) assigns)
+  -- group the assignments by root field once, in source order, instead of
+  -- rescanning the whole list for every field of every candidate shape
+  let byRoot = M.fromListWith (flip (++)) [(head path, [(path, e)]) | (path, e) <- assigns]
+      roots = M.keys byRoot
       cands = [(fs, tid) | (fs, tid) <- M.toList shapes, all (`elem` fs) roots]
   when (null cands) $ error ("no record shape has fields " ++ show roots)
-  arms <- mapM rebuild cands
+  arms <- mapM (rebuild byRoot) cands
   pure $ case arms of
     [(_, body)] -> body
     _ ->
@@ -830,13 +850,13 @@ updateRecord scrut assigns = do
         (CErr "record update: no shape matched")
         arms
   where
-    rebuild (fs, tid) = do
-      let sorted = sort fs
-      fields <- mapM (fieldValue tid) (zip [0 ..] sorted)
+    -- shape keys are stored sorted (collectShapes), so fs is field order
+    rebuild byRoot (fs, tid) = do
+      fields <- mapM (fieldValue tid) (zip [0 ..] fs)
       pure (tid, CMk tid 0 fields)
       where
         fieldValue _ (idx, f) =
-          case [(path, e) | (path, e) <- assigns, head path == f] of
+          case M.findWithDefault [] f byRoot of
             [] -> pure (CProj idx scrut)
             [([_], e)] -> dExpr e
             deeper -> do
@@ -964,38 +984,49 @@ liftProg prog = do
       extra
   pure (M.union lifted (M.fromList extra'))
   where
-    liftC globals bound = go (foldr (:) [] bound)
+    -- the enclosing binders are a Set and captures are de-duplicated with
+    -- nubOrd: a deeply nested lambda over a long body no longer pays
+    -- |fvs| x |env| list scans plus a quadratic nub at every level
+    liftC globals bound = go (S.fromList bound)
       where
         go env = \case
           CLam ps body -> do
-            body' <- go (ps ++ env) body
+            body' <- go (foldr S.insert env ps) body
             let fvs =
-                  nub
+                  nubOrd
                     [ v | v <- freeVars body', v `notElem` ps, not (v `M.member` prog), v `notElem` primNames
                     ]
-                capture = filter (`elem` (env :: [Name])) fvs
+                capture = filter (`S.member` env) fvs
             nm <- fresh "lifted"
             modify (\s -> s {dLifted = (nm, capture ++ ps, body') : dLifted s})
             pure (foldl' CApp (CVar nm) (map CVar capture))
           CApp a b -> CApp <$> go env a <*> go env b
-          CLet x a b -> CLet x <$> go env a <*> go (x : env) b
+          CLet x a b -> CLet x <$> go env a <*> go (S.insert x env) b
           CIf c t e -> CIf <$> go env c <*> go env t <*> go env e
           CMk t v fs -> CMk t v <$> mapM (go env) fs
           CTagEq t v e -> CTagEq t v <$> go env e
           CProj i e -> CProj i <$> go env e
           other -> pure other
 
+-- One pass with the binders in scope carried down and the result threaded
+-- as an accumulator: no intermediate list per node to `++` onto its parent,
+-- and no re-filtering copy of a body's names at each binder. Occurrence
+-- order (duplicates included) is the same as a left-to-right walk.
 freeVars :: Core -> [Name]
-freeVars = \case
-  CVar n -> [n]
-  CApp a b -> freeVars a ++ freeVars b
-  CLam ps b -> filter (`notElem` ps) (freeVars b)
-  CLet x a b -> freeVars a ++ filter (/= x) (freeVars b)
-  CIf c t e -> freeVars c ++ freeVars t ++ freeVars e
-  CMk _ _ fs -> concatMap freeVars fs
-  CTagEq _ _ e -> freeVars e
-  CProj _ e -> freeVars e
-  _ -> []
+freeVars e0 = go S.empty e0 []
+  where
+    go bound c acc = case c of
+      CVar n
+        | n `S.member` bound -> acc
+        | otherwise -> n : acc
+      CApp a b -> go bound a (go bound b acc)
+      CLam ps b -> go (foldr S.insert bound ps) b acc
+      CLet x a b -> go bound a (go (S.insert x bound) b acc)
+      CIf c' t e -> go bound c' (go bound t (go bound e acc))
+      CMk _ _ fs -> foldr (go bound) acc fs
+      CTagEq _ _ e -> go bound e acc
+      CProj _ e -> go bound e acc
+      _ -> acc
 
 liftFix :: Prog -> D Prog
 liftFix p = do
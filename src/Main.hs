@@ -20,7 +20,7 @@ import Data.List (intercalate, isPrefixOf)
 import qualified Data.Map.Strict as M
 import qualified Data.Set as S
 import Lang
-import Mod (resolveModule)
+import Mod (resolveModuleTops)
 import Preamble (halArities, prelude)
 import Struct (erasePSig, expandStructs, sigTable, specialize, structTable)
 import Infer (inferTops)
@@ -137,7 +137,7 @@ main = do
 
   let cons = collectCons tops
       shapes = collectShapes tops
-      (prog, _) = runState (compileTop tops >>= liftFix) (DEnv 0 cons shapes [])
+      (prog, _) = runState (compileTop tops >>= liftFix) (DEnv 0 cons shapes (fieldIndex shapes) [])
       bprog = compileProg halArities prog
 
   when dumpAsm $ do
@@ -170,39 +170,46 @@ main = do
   unless dumpAsm $ runTxLoop (takeDirectory path) dataFile journalFile consTV shapeNames bprog prog jc cons runList rt 0
 
 -- run every `>` statement in order inside one transaction, then commit;
--- on read-set conflict, reset and re-run the whole script
+-- on read-set conflict, reset and re-run the whole script. The VM env (and
+-- the HAL table inside it) is built once; a retry only clears its state.
 runTxLoop :: FilePath -> FilePath -> FilePath -> M.Map Name (Int, Int) -> M.Map Int [Name] -> BProg -> Prog -> Maybe JitCtx -> M.Map Name (Int, Int, Int) -> [Name] -> RtCounts -> Int -> IO ()
-runTxLoop base dataFile journalFile consTV shapeNames bprog core jc cons topNames rt attempt = do
+runTxLoop base dataFile journalFile consTV shapeNames bprog core jc cons topNames rt attempt0 = do
   tx <- newTx
   fuel <- newIORef fuelQuantum
   preempts <- newIORef 0
-  let env = VMEnv base dataFile consTV shapeNames bprog core jc (mkHal cons tx preempts rt) fuel preempts
-  forM_ topNames $ \n -> do
-    v <- execFn env n []
-    unless (isUnit v) $ putStrLn ("=> " ++ VM.render v)
   forceN <- lookupEnv "SOL_FORCE_RETRY"
-  let force = maybe 0 read forceN :: Int
-  res <-
-    if attempt < force
-      then pure (Conflict ["<forced>"]) -- discard this attempt's effects
-      else commit tx journalFile
-  case res of
-    Committed n -> do
-      when (n > 0) $ putStrLn ("[sol] committed " ++ show n ++ " file(s) atomically")
-      -- if the run left the transaction at any point, say so plainly: the
-      -- word "atomically" above is only true of the file set it names
-      total <- rtTotal rt
-      when (total > 0) $ do
-        kinds <- rtReport rt
-        putStrLn ("[sol] NOT atomic overall: " ++ show total
-                    ++ " realtime escape(s) — " ++ intercalate ", " kinds)
-    Conflict stale
-      | attempt + 1 >= maxRetries -> do
-          putStrLn ("[sol] giving up after " ++ show maxRetries ++ " attempts (conflicts on " ++ show stale ++ ")")
-          exitFailure
-      | otherwise -> do
-          putStrLn ("[sol] conflict on " ++ show stale ++ " — retrying (attempt " ++ show (attempt + 2) ++ ")")
-          runTxLoop base dataFile journalFile consTV shapeNames bprog core jc cons topNames rt (attempt + 1)
+  let hal = mkHal cons tx preempts rt
+      env = VMEnv base dataFile consTV shapeNames bprog core jc hal (symTable bprog hal) fuel preempts
+      force = maybe 0 read forceN :: Int
+      go attempt = do
+        forM_ topNames $ \n -> do
+          v <- execFn env n []
+          unless (isUnit v) $ putStrLn ("=> " ++ VM.render v)
+        res <-
+          if attempt < force
+            then pure (Conflict ["<forced>"]) -- discard this attempt's effects
+            else commit tx journalFile
+        case res of
+          Committed n -> do
+            when (n > 0) $ putStrLn ("[sol] committed " ++ show n ++ " file(s) atomically")
+            -- if the run left the transaction at any point, say so plainly: the
+            -- word "atomically" above is only true of the file set it names
+            total <- rtTotal rt
+            when (total > 0) $ do
+              kinds <- rtReport rt
+              putStrLn ("[sol] NOT atomic overall: " ++ show total
+                          ++ " realtime escape(s) — " ++ intercalate ", " kinds)
+          Conflict stale
+            | attempt + 1 >= maxRetries -> do
+                putStrLn ("[sol] giving up after " ++ show maxRetries ++ " attempts (conflicts on " ++ show stale ++ ")")
+                exitFailure
+            | otherwise -> do
+                putStrLn ("[sol] conflict on " ++ show stale ++ " — retrying (attempt " ++ show (attempt + 2) ++ ")")
+                resetTx tx
+                writeIORef fuel fuelQuantum
+                writeIORef preempts 0
+                go (attempt + 1)
+  go attempt0
 
 numberEvals :: [STop] -> ([STop], [Name])
 numberEvals tops = (map fst numbered, [n | (_, Just n) <- numbered])
@@ -235,10 +242,10 @@ expandUses 0 _ _ _ _ = putStrLn "[sol] use: module nesting too deep" >> exitFail
 expandUses depth prefix seenRef baseDir tops = do
   let aliases = [(mn, spec) | TBind mn [] [] (SApp (SVar "use") (SStrI [SegStr spec])) <- tops]
   pairs <- forM aliases $ \(mn, spec) -> do
-    r <- resolveModule baseDir spec
+    r <- resolveModuleTops baseDir spec
     case r of
       Left e -> putStrLn e >> exitFailure >> pure ([], (mn, mn))
-      Right (mpath, h, pinned) -> do
+      Right (mpath, h, pinned, mtops0) -> do
         unless pinned $
           putStrLn ("[sol] use (compile): " ++ spec ++ " resolves to " ++ spec ++ "#" ++ h ++ " (pin this)")
         seen <- readIORef seenRef
@@ -252,8 +259,6 @@ expandUses depth prefix seenRef baseDir tops = do
             pure ([], (mn, localName))
           Nothing -> do
             modifyIORef' seenRef (M.insert h (prefix ++ mn))
-            msrc <- readFile mpath
-            mtops0 <- parseOrDie mpath msrc
             mtops1 <- expandUses (depth - 1) (prefix ++ mn ++ ".") seenRef (takeDirectory mpath) mtops0
             let defs = [t | t <- mtops1, notEval t]
                 rn = M.fromList [(n, mn ++ "." ++ n) | n <- topNames defs]
@@ -341,21 +346,24 @@ topVars (TEval e) = exprVars e
 topVars (TStruct _ _ fs) = concatMap (exprVars . snd) fs
 topVars _ = []
 
+-- threads an accumulator so a long application spine (`f a b c ...`) or
+-- operator chain costs one cons per name; `go a ++ go b` re-copied the
+-- left-nested prefix at every level
 exprVars :: SExpr -> [Name]
-exprVars = go
+exprVars e0 = go e0 []
   where
-    go (SVar n) = [n]
-    go (SApp a b) = go a ++ go b
-    go (SLam _ b) = go b
-    go (SBlock ss b) = concatMap stmt ss ++ go b
-    go (SCase s alts) = go s ++ concatMap (go . snd) alts
-    go (SBin _ a b) = go a ++ go b
-    go (SProj e _) = go e
-    go (SRec fs) = concatMap (go . snd) fs
-    go (SUpd e fs) = go e ++ concatMap (go . snd) fs
-    go (STup es) = concatMap go es
-    go (SList es) = concatMap go es
-    go (SStrI segs) = concat [go e | SegExpr e <- segs]
-    go _ = []
-    stmt (SBind _ _ e) = go e
-    stmt (SBindPat _ e) = go e
+    go (SVar n) acc = n : acc
+    go (SApp a b) acc = go a (go b acc)
+    go (SLam _ b) acc = go b acc
+    go (SBlock ss b) acc = foldr stmt (go b acc) ss
+    go (SCase s alts) acc = go s (foldr (go . snd) acc alts)
+    go (SBin _ a b) acc = go a (go b acc)
+    go (SProj e _) acc = go e acc
+    go (SRec fs) acc = foldr (go . snd) acc fs
+    go (SUpd e fs) acc = go e (foldr (go . snd) acc fs)
+    go (STup es) acc = foldr go acc es
+    go (SList es) acc = foldr go acc es
+    go (SStrI segs) acc = foldr go acc [e | SegExpr e <- segs]
+    go _ acc = acc
+    stmt (SBind _ _ e) acc = go e acc
+    stmt (SBindPat _ e) acc = go e acc
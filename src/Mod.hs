@@ -26,7 +26,9 @@ module Mod where
 
 import Data.Bits (xor)
 import Data.Char (ord)
+import Data.IORef (IORef, atomicModifyIORef', newIORef, readIORef)
 import Data.List (foldl', isSuffixOf)
+import qualified Data.Map.Strict as M
 import Data.Word (Word64)
 import Lang (STop, program)
 import Numeric (showHex)
@@ -34,6 +36,7 @@ import System.Directory (doesFileExist)
 import System.Environment (getExecutablePath)
 import System.Exit (ExitCode (..))
 import System.FilePath ((</>))
+import System.IO.Unsafe (unsafePerformIO)
 import System.Process (readCreateProcessWithExitCode, proc)
 import Text.Megaparsec (errorBundlePretty, parse)
 
@@ -46,21 +49,46 @@ hashAST tops = pad (showHex h "")
     step acc c = (acc `xor` fromIntegral (ord c)) * 0x100000001b3
     pad s = replicate (16 - length s) '0' ++ s
 
-parseModuleFile :: FilePath -> IO (Either String (FilePath, String))
+parseModuleFile :: FilePath -> IO (Either String (FilePath, String, [STop]))
 parseModuleFile path = do
   ok <- doesFileExist path
   if not ok
     then pure (Left ("use: no such module file: " ++ path))
     else do
       src <- readFile path
-      case parse program path src of
-        Left e -> pure (Left ("use: module " ++ path ++ " does not parse:\n" ++ errorBundlePretty e))
-        Right tops -> pure (Right (path, hashAST tops))
+      let len = length src
+      seen <- M.lookup path <$> readIORef parseCache
+      case seen of
+        Just (n, old, h, tops) | n == len && old == src -> pure (Right (path, h, tops))
+        _ -> case parse program path src of
+          Left e -> pure (Left ("use: module " ++ path ++ " does not parse:\n" ++ errorBundlePretty e))
+          Right tops -> do
+            let h = hashAST tops
+            atomicModifyIORef' parseCache (\m -> (M.insert path (len, src, h, tops) m, ()))
+            pure (Right (path, h, tops))
+
+-- Parsed modules, process-global: one entry per module PATH holding the
+-- exact source it was parsed from (and its length, for a cheap reject).
+-- `run m x` inside a map re-reads the file every call to re-verify the
+-- hash; a hit requires the text on disk to be IDENTICAL to the cached
+-- text, so the AST hash handed back is always the hash of what is on disk
+-- now — no hash collision can stand in for a re-parse. Changed text is
+-- parsed again and REPLACES the path's entry, so the cache holds at most
+-- one source per module file.
+{-# NOINLINE parseCache #-}
+parseCache :: IORef (M.Map FilePath (Int, String, String, [STop]))
+parseCache = unsafePerformIO (newIORef M.empty)
 
 -- "name", "name#hash", "dir/name#hash", "name.sol#hash" — resolved
 -- relative to the importing script's directory
 resolveModule :: FilePath -> String -> IO (Either String (FilePath, String, Bool))
-resolveModule baseDir spec = do
+resolveModule baseDir spec = fmap (\(p, h, pinned, _) -> (p, h, pinned)) <$> resolveModuleTops baseDir spec
+
+-- resolveModule, also handing back the AST the hash was taken over: the
+-- compile-time splice uses it directly instead of reading and parsing the
+-- file a second time
+resolveModuleTops :: FilePath -> String -> IO (Either String (FilePath, String, Bool, [STop]))
+resolveModuleTops baseDir spec = do
   let (name, hashPart) = break (== '#') spec
       wantHash = drop 1 hashPart
       pinned = not (null wantHash)
@@ -69,7 +97,7 @@ resolveModule baseDir spec = do
   r <- parseModuleFile path
   pure $ case r of
     Left e -> Left e
-    Right (p, h)
+    Right (p, h, tops)
       | pinned && h /= wantHash ->
           Left
             ( "use: hash mismatch for " ++ name
@@ -77,7 +105,7 @@ resolveModule baseDir spec = do
                 ++ "\n  on disk #" ++ h
                 ++ "\n(the module's AST changed since it was pinned)"
             )
-      | otherwise -> Right (p, h, pinned)
+      | otherwise -> Right (p, h, pinned, tops)
 
 -- spawn `sol <path>` with `str x` on stdin; capture stdout. Hash
 -- re-verified so a pinned module can never run drifted code.
@@ -86,7 +114,7 @@ runModule path wantHash stdinStr = do
   r <- parseModuleFile path
   case r of
     Left e -> pure (Left e)
-    Right (_, h)
+    Right (_, h, _)
       | h /= wantHash ->
           pure (Left ("run: module " ++ path ++ " changed since `use` (was #" ++ wantHash ++ ", now #" ++ h ++ ")"))
       | otherwise -> do
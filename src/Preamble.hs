@@ -148,8 +148,10 @@ prelude =
       "  all = fn p xs -> case filter (fn x -> case p x of True -> False | False -> True) xs of Nil -> True | _ -> False,",
       "  len = fn xs -> foldl (fn n x -> n + 1) 0 xs,",
       "  rev = fn xs -> foldl (fn acc x -> x :: acc) [] xs,",
-      "  groupby = fn f xs -> foldl (fn acc x -> List.gbIns (f x) x acc) [] xs,",
-      "  gbIns = fn k x g -> case g of Nil -> [(k, [x])] | p :: rest -> (case p of (kk, vs) -> (case kk == k of True -> (kk, List.append vs [x]) :: rest | False -> p :: (List.gbIns k x rest)))",
+      -- groups collect in REVERSE (one cons per element, not a copy of the
+      -- whole group via append) and are flipped once at the end
+      "  groupby = fn f xs -> map (fn p -> case p of (k, vs) -> (k, List.rev vs)) (foldl (fn acc x -> List.gbIns (f x) x acc) [] xs),",
+      "  gbIns = fn k x g -> case g of Nil -> [(k, [x])] | p :: rest -> (case p of (kk, vs) -> (case kk == k of True -> (kk, x :: vs) :: rest | False -> p :: (List.gbIns k x rest)))",
       "}."
     ]
 
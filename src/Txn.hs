@@ -27,30 +27,33 @@ module Txn where
 import Control.Concurrent (threadDelay)
 import Control.Exception (IOException, try)
 import Control.Monad (foldM, forM_, unless, when)
+import qualified Data.ByteString as BS
+import qualified Data.ByteString.UTF8 as BSU
 import Data.IORef
 import Data.Maybe (mapMaybe)
 import Foreign.C.String (CString, withCString)
-import Foreign.C.Types (CInt (..))
+import Foreign.C.Types (CInt (..), CLLong (..))
+import Foreign.Marshal.Alloc (alloca)
+import Foreign.Ptr (Ptr)
+import Foreign.Storable (peek)
 import System.Environment (lookupEnv)
 import System.IO.Unsafe (unsafePerformIO)
 import Text.Read (readMaybe)
 import qualified Data.IntMap.Strict as IM
 import Data.List (isInfixOf, isSuffixOf, nub, sort)
 import qualified Data.Map.Strict as M
+import qualified Data.Set as S
 import System.Directory
   ( createDirectory,
     createDirectoryIfMissing,
     doesDirectoryExist,
     doesFileExist,
-    getFileSize,
-    getModificationTime,
     listDirectory,
     removeDirectory,
     removeFile,
     removePathForcibly,
     renamePath,
   )
-import Data.Time.Clock.POSIX (utcTimeToPOSIXSeconds)
 import System.Exit (ExitCode (..))
 import System.IO (readFile')
 import System.IO (hFlush, hIsEOF, hGetLine, stderr, stdin, stdout, hPutStrLn)
@@ -177,12 +180,13 @@ txLs ref dir = do
   let inDir p = takeDir p == dir
       takeDir p = let q = reverse (dropWhile (/= '/') (reverse p)) in if null q then "." else init q
       baseName p = reverse (takeWhile (/= '/') (reverse p))
-      added = [baseName p | (p, Just _) <- M.toList (txView s2), inDir p, baseName p `notElem` base]
-      removed = [baseName p | (p, Nothing) <- M.toList (txView s2), inDir p]
-      addedDirs = [baseName p | (p, True) <- M.toList (txDirView s2), inDir p, baseName p `notElem` base]
-  pure (sort ((base ++ added ++ addedDirs) `without` removed))
-  where
-    without xs ys = [x | x <- xs, x `notElem` ys]
+      -- membership against Sets: a large directory merged with a busy
+      -- transaction view is linear-log, not |listing| x |view| scans
+      onDisk = S.fromList base
+      added = [baseName p | (p, Just _) <- M.toList (txView s2), inDir p, not (baseName p `S.member` onDisk)]
+      removed = S.fromList [baseName p | (p, Nothing) <- M.toList (txView s2), inDir p]
+      addedDirs = [baseName p | (p, True) <- M.toList (txDirView s2), inDir p, not (baseName p `S.member` onDisk)]
+  pure (sort (filter (not . (`S.member` removed)) (base ++ added ++ addedDirs)))
 
 txExists :: IORef TxState -> FilePath -> IO Bool
 txExists ref p = do
@@ -211,10 +215,9 @@ txStat ref p = do
   snap <- snapshot ref p
   case snap of
     Nothing -> pure (False, 0, 0)
-    Just _ -> do
-      sz <- getFileSize p
-      mt <- getModificationTime p
-      pure (True, sz, floor (utcTimeToPOSIXSeconds mt))
+    -- one stat(2) for both fields; a path that vanished since the snapshot
+    -- still reports as present here — validation catches it at commit
+    Just _ -> maybe (True, 0, 0) (\(sz, mt) -> (True, sz, mt)) <$> statPath p
 
 -- ---- external commands -----------------------------------------------------
 
@@ -363,6 +366,7 @@ rtLine = do
 foreign import ccall unsafe "sol_fsync_path" c_fsyncPath :: CString -> IO CInt
 foreign import ccall unsafe "sol_pid_alive" c_pidAlive :: CInt -> IO CInt
 foreign import ccall unsafe "sol_getpid" c_getpid :: IO CInt
+foreign import ccall unsafe "sol_stat_path" c_statPath :: CString -> Ptr CLLong -> Ptr CLLong -> IO CInt
 foreign import ccall unsafe "sol_hard_exit" c_hardExit :: CInt -> IO ()
 
 -- SOL_NOSYNC=1 skips every fsync: writes stay rename-atomic (no torn
@@ -373,6 +377,23 @@ foreign import ccall unsafe "sol_hard_exit" c_hardExit :: CInt -> IO ()
 noSync :: Bool
 noSync = unsafePerformIO (maybe False (/= "0") <$> lookupEnv "SOL_NOSYNC")
 
+-- (size, mtime-seconds) of a path in a single stat; Nothing if it fails
+statPath :: FilePath -> IO (Maybe (Integer, Integer))
+statPath p = withCString p $ \cp -> alloca $ \psz -> alloca $ \pmt -> do
+  r <- c_statPath cp psz pmt
+  if r /= 0
+    then pure Nothing
+    else do
+      sz <- peek psz
+      mt <- peek pmt
+      pure (Just (fromIntegral sz, fromIntegral mt))
+
+-- SOL_CRASH_AT=k: the test hook replayEffs honours (see there). Read once
+-- per process like noSync, not on every commit attempt.
+{-# NOINLINE crashAtEnv #-}
+crashAtEnv :: Maybe Int
+crashAtEnv = unsafePerformIO ((>>= readMaybe) <$> lookupEnv "SOL_CRASH_AT")
+
 fsyncPath :: FilePath -> IO ()
 fsyncPath p = unless noSync (withCString p (fmap (const ()) . c_fsyncPath))
 
@@ -381,11 +402,14 @@ parentOf p = case reverse (dropWhile (/= '/') (reverse p)) of
   "" -> "."
   q -> q
 
--- entirely-old or entirely-new, never torn; durable once we return
+-- entirely-old or entirely-new, never torn; durable once we return.
+-- The payload is UTF-8 encoded once up front and handed to a single
+-- strict ByteString write — no Handle char buffer re-encoding it chunk
+-- by chunk on the way out.
 writeAtomic :: FilePath -> String -> IO ()
 writeAtomic p v = do
   let tmp = p ++ ".sol-tmp"
-  writeFile tmp v
+  BS.writeFile tmp (BSU.fromString v)
   fsyncPath tmp
   renamePath tmp p
   fsyncPath (parentOf p)
@@ -561,9 +585,8 @@ commit ref jpath = do
   res <-
     if null stale
       then do
-        crashAt <- (>>= readMaybe) <$> lookupEnv "SOL_CRASH_AT"
         when (not (null effs)) (writeJournal jpath effs)
-        n <- replayEffs jpath False [] crashAt (zip [0 ..] effs)
+        n <- replayEffs jpath False [] crashAtEnv (zip [0 ..] effs)
         clearJournal jpath
         pure (Committed n)
       else pure (Conflict stale)
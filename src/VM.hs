@@ -26,6 +26,9 @@ import JIT
 import Lang (Name)
 import qualified Lang
 import Control.Concurrent (threadDelay)
+import Data.Array (Array, bounds, inRange)
+import Data.Array.Base (unsafeAt)
+import Data.Array.IO (IOArray, newArray, readArray, writeArray)
 import Data.Int (Int64)
 import qualified Data.IntMap.Strict as IM
 import Foreign.Marshal.Alloc (alloca)
@@ -34,7 +37,8 @@ import Foreign.Storable (peek, poke)
 import System.Environment (lookupEnv)
 import System.IO.Unsafe (unsafePerformIO)
 import Data.IORef
-import Data.List (intercalate)
+import Data.Char (isDigit, isSpace, ord)
+import Data.List (foldl', intercalate)
 import qualified Data.Map.Strict as M
 import Control.Monad (unless, when)
 import Control.Applicative (liftA2)
@@ -52,6 +56,7 @@ data VMEnv = VMEnv
     vmCore :: Lang.Prog, -- Core, for the JIT front-end
     vmJit :: Maybe JitCtx, -- Nothing = JIT disabled, always interpret
     vmHal :: M.Map Name (Int, [Value] -> IO Value),
+    vmSyms :: M.Map Name Sym, -- symTable vmProg vmHal: PAP targets, resolved
     vmFuel :: IORef Int,
     vmPreempts :: IORef Int
   }
@@ -71,33 +76,45 @@ fuelTick env = do
     else writeIORef (vmFuel env) (f - 1)
 
 execFn :: VMEnv -> Name -> [Value] -> IO Value
-execFn env name args = do
-  fuelTick env
-  case M.lookup name (vmProg env) of
-    Nothing -> vmPanic ("no such function: " ++ name)
-    Just (Fn ar slots code) -> do
-      if length args /= ar
-        then vmPanic ("call " ++ name ++ ": arity mismatch")
-        else do
-          frame <- newIORef (M.fromList (zip [0 ..] args) :: M.Map Reg Value)
-          let codeArr = code
-          runLoop env frame codeArr 0
+execFn env name args = case M.lookup name (vmProg env) of
+  Nothing -> fuelTick env >> vmPanic ("no such function: " ++ name)
+  Just fn -> runFn env name fn args
 
+-- execFn once the function is in hand (callSym has already looked it up)
+runFn :: VMEnv -> Name -> Fn -> [Value] -> IO Value
+runFn env name (Fn ar slots code) args = do
+  fuelTick env
+  if length args /= ar
+    then vmPanic ("call " ++ name ++ ": arity mismatch")
+    else do
+      -- registers are dense ints below fnSlots: index a flat frame
+      -- instead of keying a Map by register number; args forced like wr
+      frame <- newArray (0, slots - 1) Nothing
+      mapM_ (\(r, v) -> v `seq` writeArray frame r (Just v)) (zip [0 ..] args)
+      runLoop env frame code 0
+
+-- the cold path: kept out of line so the dozens of panic sites in runLoop
+-- and the HAL don't inline error-raising code into the hot dispatch
+{-# NOINLINE vmPanic #-}
 vmPanic :: String -> IO a
 vmPanic m = ioError (userError ("*** SOL PANIC: " ++ m ++ " ***"))
 
-runLoop :: VMEnv -> IORef (M.Map Reg Value) -> [Instr] -> Int -> IO Value
+runLoop :: VMEnv -> IOArray Reg (Maybe Value) -> Array Int Instr -> Int -> IO Value
 runLoop env frame code = go
   where
-    fetch pc = case drop pc code of
-      (i : _) -> i
-      [] -> error "pc out of range"
-    rd r = do
-      m <- readIORef frame
-      case M.lookup r m of
+    -- one bounds check per instruction: the guard, then an unchecked
+    -- read (fnCode is always indexed from 0, so pc is the raw offset)
+    fetch pc
+      | inRange (bounds code) pc = unsafeAt code pc
+      | otherwise = error "pc out of range"
+    rd r =
+      readArray frame r >>= \case
         Just v -> pure v
         Nothing -> vmPanic ("read of unwritten slot r" ++ show r)
-    wr r v = modifyIORef' frame (M.insert r v)
+    -- forced on the way in, as Map.Strict's insert did: a boxed IOArray
+    -- stores lazily, and a thunk like Proj's `fs !! i` would pin its whole
+    -- parent value in the frame (and in every Mk/Call it flows into)
+    wr r v = v `seq` writeArray frame r (Just v)
 
     go pc = case fetch pc of
       LoadI r i -> wr r (VInt i) >> go (pc + 1)
@@ -146,30 +163,48 @@ runLoop env frame code = go
       Ret r -> rd r
       ErrI m -> vmPanic m
 
+-- What a global name means when it is made into a PAP or a PAP saturates.
+-- Program functions shadow builtins, builtins shadow the arithmetic ops,
+-- and those shadow the HAL; symTable applies that precedence ONCE per run,
+-- so MKPAP and every saturation cost one lookup instead of a chain of
+-- member tests across four tables.
+data Sym
+  = SymFn Fn
+  | SymBuiltin Int (VMEnv -> [Value] -> IO Value)
+  | SymArith ArithOp
+  | SymHal Int ([Value] -> IO Value)
+
+symTable :: BProg -> M.Map Name (Int, [Value] -> IO Value) -> M.Map Name Sym
+symTable prog hal =
+  M.unions
+    [ M.map SymFn prog,
+      M.map (uncurry SymBuiltin) builtins,
+      M.map SymArith arithOps,
+      M.map (uncurry SymHal) hal
+    ]
+
 arityOf :: VMEnv -> Name -> IO Int
-arityOf env g = case M.lookup g (vmProg env) of
-  Just fn -> pure (fnArity fn)
-  Nothing -> case M.lookup g builtinArities of
-    Just ar -> pure ar
-    Nothing -> case M.lookup g (vmHal env) of
-      Just (ar, _) -> pure ar
-      Nothing
-        | M.member g arithOps -> pure 2
-        | otherwise -> vmPanic ("unknown symbol: " ++ g)
-
--- fpr_apply's twin: accumulate into a PAP; call at saturation
+arityOf env g = case M.lookup g (vmSyms env) of
+  Just (SymFn fn) -> pure (fnArity fn)
+  Just (SymBuiltin ar _) -> pure ar
+  Just (SymArith _) -> pure 2
+  Just (SymHal ar _) -> pure ar
+  Nothing -> vmPanic ("unknown symbol: " ++ g)
+
+-- fpr_apply's twin: accumulate into a PAP (each arg forced on the way in,
+-- see VPap); call at saturation
 apply :: VMEnv -> Value -> Value -> IO Value
 apply env (VPap g as 1) a = callSym env g (reverse (a : as))
-apply _ (VPap g as n) a = pure (VPap g (a : as) (n - 1))
+apply _ (VPap g as n) a = a `seq` pure (VPap g (a : as) (n - 1))
 apply _ v _ = vmPanic ("APPLY: not a function: " ++ show v)
 
 callSym :: VMEnv -> Name -> [Value] -> IO Value
-callSym env g args
-  | M.member g (vmProg env) = execFn env g args
-  | M.member g builtinArities = builtinCall env g args
-  | Just op <- M.lookup g arithOps, [a, b] <- args = arith op a b
-  | Just (_, f) <- M.lookup g (vmHal env) = f args
-  | otherwise = vmPanic ("call to unknown symbol: " ++ g)
+callSym env g args = case M.lookup g (vmSyms env) of
+  Just (SymFn fn) -> runFn env g fn args
+  Just (SymBuiltin _ h) -> h env args
+  Just (SymArith op) | [a, b] <- args -> arith op a b
+  Just (SymHal _ f) -> f args
+  _ -> vmPanic ("call to unknown symbol: " ++ g)
 
 -- The BStr ref table, process-global.
 --
@@ -220,30 +255,32 @@ arithN op a b = case op of
   ONe -> pure (vBool (a /= b))
 
 halCall :: VMEnv -> Name -> [Value] -> IO Value
-halCall env g args
-  | M.member g builtinArities = builtinCall env g args
-  | otherwise = case M.lookup g (vmHal env) of
-      Just (ar, f)
-        | length args == ar -> f args
-        | otherwise -> vmPanic ("HCALL " ++ g ++ ": arity mismatch")
-      Nothing -> vmPanic ("HCALL: unknown HAL symbol " ++ g)
-
-builtinArities :: M.Map Name Int
-builtinArities =
-  M.union schemeArities $
-    M.fromList
-      [ ("use", 1), ("run", 2), ("View.serve", 5),
-        ("Vec.new", 1), ("Vec.push", 2), ("Vec.len", 1), ("Vec.get", 2),
-        ("Vec.set", 3), ("Vec.map", 2), ("Vec.filter", 2), ("Vec.fold", 3),
-        ("Vec.toList", 1), ("Vec.fromList", 1), ("Vec.free", 1)
-      ]
-
-builtinCall :: VMEnv -> Name -> [Value] -> IO Value
-builtinCall env g args
-  | M.member g schemeArities = schemeCall env g args
-  | g == "use" || g == "run" = modCall env g args
-  | g == "View.serve" = viewServe env args
-  | otherwise = vecCall env g args
+halCall env g args = case M.lookup g builtins of
+  Just (_, h) -> h env args
+  Nothing -> case M.lookup g (vmHal env) of
+    Just (ar, f)
+      | length args == ar -> f args
+      | otherwise -> vmPanic ("HCALL " ++ g ++ ": arity mismatch")
+    Nothing -> vmPanic ("HCALL: unknown HAL symbol " ++ g)
+
+-- builtin name -> (arity, handler). Each handler is bound to its family
+-- here, once, so a call is a single lookup rather than a member test per
+-- family followed by name comparisons.
+builtins :: M.Map Name (Int, VMEnv -> [Value] -> IO Value)
+builtins =
+  M.fromList $
+    [(g, (ar, \env -> schemeCall env g)) | (g, ar) <- M.toList schemeArities]
+      ++ [ ("use", (1, \env -> modCall env "use")),
+           ("run", (2, \env -> modCall env "run")),
+           ("View.serve", (5, viewServe))
+         ]
+      ++ [ (g, (ar, \env -> vecCall env g))
+         | (g, ar) <-
+             [ ("Vec.new", 1), ("Vec.push", 2), ("Vec.len", 1), ("Vec.get", 2),
+               ("Vec.set", 3), ("Vec.map", 2), ("Vec.filter", 2), ("Vec.fold", 3),
+               ("Vec.toList", 1), ("Vec.fromList", 1), ("Vec.free", 1)
+             ]
+         ]
 
 -- ---- gen_view: the MVU web behavior (Web.hs owns the transport) -------------
 viewServe :: VMEnv -> [Value] -> IO Value
@@ -378,35 +415,59 @@ schemeCall env name args = case (name, args) of
     unappliedFn (VPap g [] _) | M.member g (vmProg env) = Just g
     unappliedFn _ = Nothing
 
+    -- an operator section like `(+) 1` or `(<) 10` as the element
+    -- function: the operator is resolved once, and each element is one
+    -- `arith` instead of a PAP saturation through apply and callSym
+    stepOf f = case f of
+      VPap g [c] 1 | Just (SymArith op) <- M.lookup g (vmSyms env) -> arith op c
+      _ -> apply env f
     interpMap f = go
       where
+        step = stepOf f
         go (VData t 1 [x, r]) | t == listT = do
-          y <- apply env f x
+          y <- step x
           rest <- go r
           pure (VData listT 1 [y, rest])
         go (VData t 0 []) | t == listT = pure (VData listT 0 [])
         go v = vmPanic ("map: not a list: " ++ render v)
     interpFilter f = go
       where
+        step = stepOf f
         go (VData t 1 [x, r]) | t == listT = do
-          keep <- apply env f x
+          keep <- step x
           rest <- go r
-          case keep of
-            VData bt 1 [] | bt == boolT -> pure (VData listT 1 [x, rest])
-            VData bt 0 [] | bt == boolT -> pure rest
-            VInt n -> pure (if n /= 0 then VData listT 1 [x, rest] else rest)
-            v -> vmPanic ("filter: predicate returned non-bool: " ++ render v)
+          case predVerdict keep of
+            Just True -> pure (VData listT 1 [x, rest])
+            Just False -> pure rest
+            Nothing -> vmPanic ("filter: predicate returned non-bool: " ++ render keep)
         go (VData t 0 []) | t == listT = pure (VData listT 0 [])
         go v = vmPanic ("filter: not a list: " ++ render v)
-    interpFold f = go
+    -- `foldl (+) 0 xs` is the common aggregation: the operator is resolved
+    -- once up front, so each step is one `arith` instead of two APPLYs
+    -- through a PAP and a symbol lookup in callSym
+    interpFold f = case f of
+      VPap g [] 2 | Just (SymArith op) <- M.lookup g (vmSyms env) -> goOp op
+      _ -> go
       where
         go acc (VData t 1 [x, r]) | t == listT = do
           acc' <- apply env f acc >>= \pf -> apply env pf x
           go acc' r
         go acc (VData t 0 []) | t == listT = pure acc
         go _ v = vmPanic ("foldl: not a list: " ++ render v)
+        goOp op acc (VData t 1 [x, r]) | t == listT = do
+          acc' <- arith op acc x
+          goOp op acc' r
+        goOp _ acc (VData t 0 []) | t == listT = pure acc
+        goOp _ _ v = vmPanic ("foldl: not a list: " ++ render v)
 
 
+-- what a filter predicate returned: a Bool, or an Int read C-style
+-- (nonzero keeps). List filter panics on anything else; Vec.filter drops it.
+predVerdict :: Value -> Maybe Bool
+predVerdict (VData t v []) | t == boolT = Just (v /= 0)
+predVerdict (VInt k) = Just (k /= 0)
+predVerdict _ = Nothing
+
 -- a scheme function is JIT-callable if it's a top-level supercombinator
 -- with the right number of args REMAINING and every already-captured arg
 -- is an unboxed int (delivered as the dual's extras)
@@ -490,7 +551,7 @@ mkHal cons tx preempts rt =
   M.fromList
     [ ("str", (1, \[v] -> pure (VStr (render v)))),
       -- VStr ops: accept VStr; all O(n) due to linked-list backing
-      ("strcat", (2, \[a, b] -> fmap VStr (liftA2 (++) (vsStr a) (vsStr b)))),
+      ("strcat", (2, strcatH)),
       ("String.len", (1, \[v] -> VInt . fromIntegral . length <$> vsStr v)),
       ("strlen", (1, \[v] -> VInt . fromIntegral . length <$> vsStr v)),
       ("charAt", (2, charAtH)),
@@ -502,15 +563,13 @@ mkHal cons tx preempts rt =
       -- At the Sol level, BStr looks like `BStr Int` (the Int is a ref-table
       -- key). The HAL dispatches via mkBStr/withBStr/consumeBStr.
       ("BStr.new", (1, \[_] -> newIORef (BStrStore initialBsCap 0 (BS.replicate initialBsCap 0)) >>= mkBStr)),
-      ("BStr.fromStr", (1, \[v] -> vsStr v >>= \s -> do r <- newIORef =<< (let bs = BSU.fromString s; n = BS.length bs; cap = max initialBsCap (n * 2) in pure (BStrStore cap n (bs <> BS.replicate (max 0 (cap - n)) 0))); mkBStr r)),
+      ("BStr.fromStr", (1, \[v] -> vsStr v >>= bstrOf)),
       ("BStr.toStr", (1, \[v] -> withBStr v (\r -> VStr <$> bsContent r) >>= \res -> consumeBStr v >> pure res)),
       ("BStr.append", (2, \[sv, bv] -> withBStr bv (\r -> vsStr sv >>= bsAppendStr r) >> pure bv)),
       ("BStr.cat", (2, \[a, b] -> do
           sa <- case a of VStr s -> pure s; _ -> withBStr a bsContent
           sb <- case b of VStr s -> pure s; _ -> withBStr b bsContent
-          let bs = BSU.fromString (sa ++ sb); n = BS.length bs; cap = max initialBsCap (n * 2)
-          r <- newIORef (BStrStore cap n (bs <> BS.replicate (max 0 (cap - n)) 0))
-          mkBStr r)),
+          bstrOf (sa ++ sb))),
       ("BStr.len", (1, \[v] -> withBStr v (\r -> do n <- bsCpLen r; pure (VData 4 0 [VInt (fromIntegral n), v])))),
       ("BStr.at", (2, \[v, VInt i] -> withBStr v (\r -> do c <- bsCpAt r (fromIntegral i - 1); pure (VData 4 0 [VInt (fromIntegral c), v])))),
       ("BStr.sub", (3, \[v, VInt i, VInt j] -> withBStr v (\r -> do
@@ -518,10 +577,9 @@ mkHal cons tx preempts rt =
           let lo = fromIntegral i; hi = fromIntegral j
           if lo < 1 || hi > length s || lo > hi
             then vmPanic "BStr.sub: index out of range"
-            else do let bs = BSU.fromString (take (hi - lo + 1) (drop (lo - 1) s)); n = BS.length bs; cap = max initialBsCap (n * 2)
-                    r2 <- newIORef (BStrStore cap n (bs <> BS.replicate (max 0 (cap - n)) 0))
-                    sl <- mkBStr r2
-                    pure (VData 4 0 [sl, v])))),
+            else do
+              sl <- bstrOf (take (hi - lo + 1) (drop (lo - 1) s))
+              pure (VData 4 0 [sl, v])))),
       ("BStr.free", (1, \[v] -> consumeBStr v >> pure vUnit)),
       ("error", (1, \[v] -> vmPanic (render v))),
       ("parseInt", (1, parseIntH)),
@@ -553,13 +611,24 @@ mkHal cons tx preempts rt =
     (pathT, handleT) = (tidOf "Path", tidOf "Handle")
     bstrT = tidOf "BStr"
     mkBStr r = do k <- bstInsert bst r; pure (VData bstrT 0 [VInt (fromIntegral k)])
+    -- a fresh table-backed BStr holding s, with room to append in place
+    bstrOf s = do
+      let bs = BSU.fromString s; n = BS.length bs; cap = max initialBsCap (n * 2)
+      r <- newIORef (BStrStore cap n (bs <> BS.replicate (max 0 (cap - n)) 0))
+      mkBStr r
     withBStr (VData t 0 [VInt k]) f | t == bstrT = bstLookup bst (fromIntegral k) >>= f
     withBStr v _ = vmPanic ("BStr op: not a BStr: " ++ render v)
     consumeBStr (VData t 0 [VInt k]) | t == bstrT = bstDelete bst (fromIntegral k)
     consumeBStr v = vmPanic ("BStr.free: not a BStr: " ++ render v)
     tidOf n = maybe (-1) (\(t, _, _) -> t) (M.lookup n cons)
     conTV n = maybe (-1, -1) (\(t, v, _) -> (t, v)) (M.lookup n cons)
-    isCon n t g = conTV n == (t, g)
+    -- the Io constructors' (tid, variant) pairs, resolved ONCE when the HAL
+    -- is built; decoding a read/write is then Int compares rather than a
+    -- name lookup in the constructor table per guard
+    isCon c t g = c == (t, g)
+    (cLs, cExists, cIsDir, cStat, cSh) = (conTV "Ls", conTV "Exists", conTV "IsDir", conTV "Stat", conTV "Sh")
+    (cNow, cNowSh, cNowLine, cNowSet, cNowAdd) = (conTV "Now", conTV "NowSh", conTV "NowLine", conTV "NowSet", conTV "NowAdd")
+    (cDir, cRm, cRmDir) = (conTV "Dir", conTV "Rm", conTV "RmDir")
 
     readIoH v
       | Just p <- unPath v = case p of
@@ -567,28 +636,28 @@ mkHal cons tx preempts rt =
           "/dev/fuel" -> VInt . fromIntegral <$> readIORef preempts
           _ -> VStr <$> txReadWhole p
     readIoH (VData t g [q])
-      | isCon "Ls" t g = withP q (\p -> strList <$> txLs tx p)
-      | isCon "Exists" t g = withP q (\p -> vBool <$> txExists tx p)
-      | isCon "IsDir" t g = withP q (\p -> vBool <$> txIsDir tx p)
-      | isCon "Stat" t g = withP q (\p -> do
+      | isCon cLs t g = withP q (\p -> strList <$> txLs tx p)
+      | isCon cExists t g = withP q (\p -> vBool <$> txExists tx p)
+      | isCon cIsDir t g = withP q (\p -> vBool <$> txIsDir tx p)
+      | isCon cStat t g = withP q (\p -> do
           (e, sz, mt) <- txStat tx p
           pure (VData 5 0 [vBool e, VInt (fromIntegral sz), VInt (fromIntegral mt)]))
-      | isCon "Sh" t g = withS q (\c -> do
+      | isCon cSh t g = withS q (\c -> do
           (code, out) <- txSh c
           pure (VData 4 0 [VInt (fromIntegral code), VStr out]))
       -- ---- realtime reads: outside the transaction ----
-      | isCon "Now" t g = withP q (\p -> do
+      | isCon cNow t g = withP q (\p -> do
           noteEscape rt "readNow"
             ("re-reads " ++ p ++ " from disk; not snapshotted, so this value "
               ++ "is not validated at commit (transactional: readPath)")
           VStr . maybe "" id <$> rtRead p)
-      | isCon "NowSh" t g = withS q (\c -> do
+      | isCon cNowSh t g = withS q (\c -> do
           noteEscape rt "shNow"
             ("streams `" ++ c ++ "` live and re-runs on every retry "
               ++ "(transactional: shq, which runs once inside the commit)")
           VInt . fromIntegral <$> rtShell c)
     readIoH (VData t g [])
-      | isCon "NowLine" t g = do
+      | isCon cNowLine t g = do
           noteEscape rt "readLineNow"
             "reads one line of stdin now; re-reads on retry (transactional: input)"
           VStr <$> rtLine
@@ -603,13 +672,13 @@ mkHal cons tx preempts rt =
       Just p -> case v of
         VStr s -> txWriteWhole p s
         VData t g []
-          | isCon "Dir" t g -> txMkdirp tx p >> pure vUnit
-          | isCon "Rm" t g -> txRm tx p >> pure vUnit
-          | isCon "RmDir" t g -> txRmdir tx p >> pure vUnit
+          | isCon cDir t g -> txMkdirp tx p >> pure vUnit
+          | isCon cRm t g -> txRm tx p >> pure vUnit
+          | isCon cRmDir t g -> txRmdir tx p >> pure vUnit
         -- ---- realtime writes: land on disk before commit ----
         VData t g [sv]
-          | isCon "NowSet" t g -> rtOut p sv "writeNow" rtWrite
-          | isCon "NowAdd" t g -> rtOut p sv "appendNow" rtAppend
+          | isCon cNowSet t g -> rtOut p sv "writeNow" rtWrite
+          | isCon cNowAdd t g -> rtOut p sv "appendNow" rtAppend
         bad -> vmPanic ("write " ++ p ++ ": cannot decode " ++ render bad)
       Nothing -> vmPanic ("write: expected a path or string, got " ++ render pv)
 
@@ -692,9 +761,21 @@ mkHal cons tx preempts rt =
       Nothing -> vmPanic ("close: not a Handle: " ++ render v)
     closeH _ = vmPanic "close: arity"
 
-    parseIntH [VStr s] = case reads (dropWhile (== ' ') s) :: [(Integer, String)] of
-      [(n, rest)] | all (`elem` " \n\t") rest -> pure (VInt n)
+    -- plain VStr on both sides is the common case: concatenate directly
+    -- rather than detouring through vsStr's BStr-aware IO path
+    strcatH [VStr a, VStr b] = pure (VStr (a ++ b))
+    strcatH [a, b] = fmap VStr (liftA2 (++) (vsStr a) (vsStr b))
+    strcatH _ = vmPanic "strcat: arity"
+
+    -- one left-to-right pass over [-]digits: no Read lexer, no token list
+    parseIntH [VStr s] = case span isDigit unsigned of
+      (ds@(_ : _), rest) | all (`elem` " \n\t") rest -> pure (VInt (sign (foldl' digit 0 ds)))
       _ -> vmPanic ("parseInt: not an integer: " ++ show s)
+      where
+        (sign, unsigned) = case dropWhile isSpace s of
+          '-' : t -> (negate, t)
+          t -> (id, t)
+        digit n d = n * 10 + toInteger (ord d - ord '0')
     parseIntH [v] = vmPanic ("parseInt: not a string: " ++ render v)
     parseIntH _ = vmPanic "parseInt: arity"
 
@@ -707,13 +788,6 @@ mkHal cons tx preempts rt =
             else vmPanic "charAt: index out of range"
     charAtH _ = vmPanic "charAt: bad args"
 
-    bsSubH [VBStr r, VInt i, VInt j] = do
-      s <- bsContent r
-      let lo = fromIntegral i; hi = fromIntegral j
-      if lo < 1 || hi > length s || lo > hi
-        then vmPanic "BStr.sub: index out of range"
-        else bstrFromString (take (hi - lo + 1) (drop (lo - 1) s))
-    bsSubH _ = vmPanic "BStr.sub: bad args"
     indexH [xs, VInt i] = idx xs i
       where
         idx (VVec r) k = getVec r (fromIntegral k - 1) -- O(1); consumes the vector (linearity) — Vec.get keeps it
@@ -725,12 +799,18 @@ mkHal cons tx preempts rt =
 
 -- IO-capable equality: needed for VBStr comparisons.
 veqIO :: BStrTable -> Value -> Value -> IO Bool
-veqIO bst a b = do
-  sa <- strOf a; sb <- strOf b
-  case (sa, sb) of
-    (Just x, Just y) -> pure (x == y)
-    _ -> pure (veq a b)
+-- Only a handle-shaped VData (one Int field, variant 0) can name a BStr, so
+-- every other pair is decided by the pure veq without touching the table.
+veqIO bst a b
+  | not (handleLike a || handleLike b) = pure (veq a b)
+  | otherwise = do
+      sa <- strOf a; sb <- strOf b
+      case (sa, sb) of
+        (Just x, Just y) -> pure (x == y)
+        _ -> pure (veq a b)
   where
+    handleLike (VData _ 0 [VInt _]) = True
+    handleLike _ = False
     strOf (VStr s) = pure (Just s)
     strOf (VData _ 0 [VInt k]) = do
       m <- readIORef bst
@@ -788,9 +868,11 @@ vecScheme :: VMEnv -> String -> Value -> Maybe Value -> IORef VecStore -> IO Val
 vecScheme env scheme f macc r = do
   st <- readIORef r
   n <- lenVec r
-  case (vmJit env, jitCallable env scheme f) of
-    (Just _, Just (g, ex)) | getEnvDebug -> putStrLn ("[jit-debug] " ++ scheme ++ " f=" ++ g ++ " extras=" ++ show (length ex) ++ " n=" ++ show n ++ " layout=" ++ maybe "?" (\(_, _, sg) -> sg) (layoutInfo st))
-    (Just _, Nothing) | getEnvDebug -> putStrLn ("[jit-debug] " ++ scheme ++ " fn not JIT-callable: " ++ render f)
+  -- the flag is tested FIRST: with debugging off nothing below is matched,
+  -- so the non-debug path never evaluates jitCallable just to discard it
+  when getEnvDebug $ case (vmJit env, jitCallable env scheme f) of
+    (Just _, Just (g, ex)) -> putStrLn ("[jit-debug] " ++ scheme ++ " f=" ++ g ++ " extras=" ++ show (length ex) ++ " n=" ++ show n ++ " layout=" ++ maybe "?" (\(_, _, sg) -> sg) (layoutInfo st))
+    (Just _, Nothing) -> putStrLn ("[jit-debug] " ++ scheme ++ " fn not JIT-callable: " ++ render f)
     _ -> pure ()
   jitted <- case (vmJit env, jitCallable env scheme f, layoutInfo st, accTyOf macc) of
     (Just jc, Just (g, extras), Just (scalar, ks, sig), Just aty0)
@@ -837,11 +919,7 @@ vecScheme env scheme f macc r = do
           | otherwise = do
               x <- getVec r i
               kv <- apply env f x
-              let kept = case kv of
-                    VData bt 1 [] | bt == boolT -> True
-                    VData bt 0 [] | bt == boolT -> False
-                    VInt k -> k /= 0
-                    _ -> False
+              let kept = predVerdict kv == Just True
               filterIdx (i + 1) lim (if kept then i : acc else acc)
         foldGo acc i lim
           | i >= lim = pure acc
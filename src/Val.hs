@@ -67,7 +67,11 @@ data Value
   -- VStr results from system calls with VBStr buffers is not a type error.
   | VBStr (IORef BStrStore)
   | VData !Int !Int [Value]
-  | VPap String [Value] !Int -- global or HAL symbol, collected args, remaining
+  -- fields are WHNF-strict: the name, the args list's spine head and the
+  -- count are forced, the captured args are not (a bang on a list stops at
+  -- its first cons). apply forces each arg as it conses it on, so a PAP
+  -- held across every element of a scheme carries no thunk in its args.
+  | VPap !String ![Value] !Int -- global or HAL symbol, collected args, remaining
   | VVec (IORef VecStore) -- the linear SoA vector
   | VMod FilePath String -- content-addressed file module: path + AST hash
 
@@ -51,7 +51,7 @@ import Data.Word (Word32, Word64, Word8)
 import Network.Socket
 import Network.Socket.ByteString (recv, sendAll)
 import System.Directory (doesFileExist)
-import System.IO (BufferMode (LineBuffering), Handle, IOMode (AppendMode), hFlush, hPutStrLn, hSetBuffering, openFile, readFile', stdout)
+import System.IO (BufferMode (LineBuffering), Handle, IOMode (AppendMode, ReadMode), hFlush, hGetLine, hIsEOF, hPutStrLn, hSetBuffering, openFile, readFile', stdout, withFile)
 import Val
 
 type Shapes = M.Map Int [String]
@@ -89,19 +89,36 @@ serveWeb port dataFile shapes cons subs cbs = do
   let persistT = maybe (-1) fst (M.lookup "Persistent" cons)
   -- replay the msg log before opening the socket
   haveLog <- doesFileExist dataFile
+  -- streamed a line at a time: the log only ever grows, so replay keeps
+  -- one entry live rather than the whole file as a String plus msg list
+  let replayOne (tok, ev, val) = do
+        known <- readIORef sessions
+        model <- case M.lookup tok known of
+          Just (m, _) -> pure m
+          Nothing -> cbInit cbs (VStr tok)
+        r <- cbUpdate cbs (mkMsg ev val) model
+        let (model', _cmd) = splitUpd r -- cmds are NOT re-executed on replay
+        modifyIORef' sessions (M.insert tok (model', M.empty))
+      logEntry ln = do
+        let kv = parseFlat ln
+        tok <- lookup "tok" kv
+        ev <- lookup "ev" kv
+        pure (tok, ev, maybe "" id (lookup "val" kv))
+      replayLog k h = do
+        eof <- hIsEOF h
+        if eof
+          then pure k
+          else do
+            ln <- hGetLine h
+            case logEntry ln of
+              -- forced per entry: a lazy k + 1 would grow a thunk chain
+              -- as long as the log itself
+              Just m -> let k' = k + 1 :: Int in replayOne m >> (k' `seq` replayLog k' h)
+              Nothing -> replayLog k h
   when haveLog $ do
-    txt <- readFile' dataFile
-    let msgs = [(tok, ev, val) | ln <- lines txt, not (null ln), let kv = parseFlat ln, Just tok <- [lookup "tok" kv], Just ev <- [lookup "ev" kv], let val = maybe "" id (lookup "val" kv)]
-    forM_ msgs $ \(tok, ev, val) -> do
-      known <- readIORef sessions
-      model <- case M.lookup tok known of
-        Just (m, _) -> pure m
-        Nothing -> cbInit cbs (VStr tok)
-      r <- cbUpdate cbs (mkMsg ev val) model
-      let (model', _cmd) = splitUpd r -- cmds are NOT re-executed on replay
-      modifyIORef' sessions (M.insert tok (model', M.empty))
+    replayed <- withFile dataFile ReadMode (replayLog 0)
     n <- M.size <$> readIORef sessions
-    putStrLn ("[view] replayed " ++ show (length msgs) ++ " msg(s) -> " ++ show n ++ " session(s) from " ++ dataFile)
+    putStrLn ("[view] replayed " ++ show replayed ++ " msg(s) -> " ++ show n ++ " session(s) from " ++ dataFile)
   logH <- openFile dataFile AppendMode >>= newMVar
   -- the shared KV store: cross-session state (user accounts, app data),
   -- persisted to its own append log, last write per key wins on load
@@ -350,14 +367,15 @@ collectDyn shapes conNames = go M.empty
     lastSeg n = case break (== '.') n of
       (_, '.' : rest) -> lastSeg rest
       _ -> n
+    -- the DynN constructor(s), found once rather than name-split per node
+    dynCons = M.filter ((== "DynN") . lastSeg) conNames
     go acc (VData tid 0 fs)
       | Just names <- M.lookup tid shapes,
         names == ["dyn", "node"],
         [VStr name, node] <- fs =
           go (M.insert name (jsonVC shapes conNames node) acc) node
     go acc (VData t c fs)
-      | Just nm <- M.lookup (t, c) conNames,
-        lastSeg nm == "DynN",
+      | M.member (t, c) dynCons,
         [VStr name, node] <- fs =
           go (M.insert name (jsonVC shapes conNames node) acc) node
       | otherwise = foldl' go acc fs
@@ -382,8 +400,11 @@ jsonVC shapes conNames = go
     lastSeg n = case break (== '.') n of
       (_, '.' : rest) -> lastSeg rest
       _ -> n
+    -- constructor tags reduced to their last segment once per
+    -- serialization, not re-split at every node of the view tree
+    conTags = M.map lastSeg conNames
     go v@(VData t c fs)
-      | Just nm <- M.lookup (t, c) conNames = case (lastSeg nm, fs) of
+      | Just tag <- M.lookup (t, c) conTags = case (tag, fs) of
           ("Txt", [x]) -> obj [("text", go x)]
           ("El", [tg, cl, ks]) -> obj [("tag", go tg), ("cls", go cl), ("kids", go ks)]
           ("EvN", [ev, val, nd]) -> obj [("ev", go ev), ("val", go val), ("node", go nd)]
@@ -408,16 +429,20 @@ jsonVC shapes conNames = go
           "{" ++ intercalateC [jstr n ++ ":" ++ go f | (n, f) <- zip names fs] ++ "}"
     goPlain other = jstr (render other)
 
+-- one right fold that conses straight onto the rest of the output: the
+-- common unescaped character costs a single cons, not a singleton list
+-- for concatMap to copy
 jstr :: String -> String
-jstr s = "\"" ++ concatMap esc s ++ "\""
+jstr s = '"' : foldr esc "\"" s
   where
-    esc '"' = "\\\""
-    esc '\\' = "\\\\"
-    esc '\n' = "\\n"
-    esc '\r' = "\\r"
-    esc '\t' = "\\t"
-    esc c | ord c < 32 = "\\u00" ++ [hexDig (ord c `div` 16), hexDig (ord c `mod` 16)]
-    esc c = [c]
+    esc '"' r = '\\' : '"' : r
+    esc '\\' r = '\\' : '\\' : r
+    esc '\n' r = '\\' : 'n' : r
+    esc '\r' r = '\\' : 'r' : r
+    esc '\t' r = '\\' : 't' : r
+    esc c r
+      | ord c < 32 = '\\' : 'u' : '0' : '0' : hexDig (ord c `div` 16) : hexDig (ord c `mod` 16) : r
+      | otherwise = c : r
     hexDig n = "0123456789abcdef" !! n
 
 -- flat {"k":"v","k2":null} parser: enough for the client protocol + the log
@@ -25,8 +25,9 @@ module Main where
 
 import Bytecode (compileProg)
 import Control.Exception (SomeException, try)
-import Control.Monad (unless)
+import Control.Monad (forM_, unless)
 import Control.Monad.State.Strict (runState)
+import Data.Char (isDigit, isSpace)
 import Data.IORef (newIORef)
 import Data.List (intercalate, sortOn)
 import qualified Data.Map.Strict as M
@@ -79,13 +80,14 @@ runSol userSrc = do
                     else do
                       let cons = collectCons allX
                           shapes = collectShapes allX
-                          (prog, _) = runState (compileTop allX >>= liftFix) (DEnv 0 cons shapes [])
+                          (prog, _) = runState (compileTop allX >>= liftFix) (DEnv 0 cons shapes (fieldIndex shapes) [])
                           bprog = compileProg halArities prog
                       tx <- newTx
                       preempts <- newIORef 0
                       rt <- newRtCounts
                       fuel <- newIORef fuelQuantum
-                      let env =
+                      let hal = mkHal cons tx preempts rt
+                          env =
                             VMEnv
                               { vmBaseDir = ".",
                                 vmDataFile = "/tmp/props.soldata",
@@ -94,7 +96,8 @@ runSol userSrc = do
                                 vmProg = bprog,
                                 vmCore = prog,
                                 vmJit = Nothing,
-                                vmHal = mkHal cons tx preempts rt,
+                                vmHal = hal,
+                                vmSyms = symTable bprog hal,
                                 vmFuel = fuel,
                                 vmPreempts = preempts
                               }
@@ -342,9 +345,15 @@ rprim "Str.at" [RS s, RI i]
   | i >= 1 && i <= fromIntegral (length s) =
       Right (RI (fromIntegral (fromEnum (s !! fromIntegral (i - 1)))))
   | otherwise = Left "charAt: range"
-rprim "Str.parse" [RS s] = case reads (dropWhile (== ' ') s) :: [(Integer, String)] of
-  [(n, _)] -> Right (RI n)
+-- decimal only: optional leading whitespace, optional '-', at least one
+-- digit, then nothing but spaces/newlines/tabs. No hex, no parens, no '+'.
+rprim "Str.parse" [RS s] = case span isDigit unsigned of
+  (ds@(_ : _), rest) | all (`elem` " \n\t") rest -> Right (RI (sign (read ds)))
   _ -> Left "parseInt"
+  where
+    (sign, unsigned) = case dropWhile isSpace s of
+      '-' : t -> (negate, t)
+      t -> (id, t)
 rprim "strlen" [RS s] = Right (RI (fromIntegral (length s)))
 rprim "strcat" [RS a, RS b] = Right (RS (a ++ b))
 rprim "str" [v] = Right (RS (rvRender v))
@@ -486,6 +495,11 @@ genExpr ah defs env ty d
           (\a -> GCall "List.len" [a]) <$> sub (TL TI),
           (\a -> GCall "Str.len" [a]) <$> sub TS,
           (\a -> GCall "Str.parse" [GCall "str" [a]]) <$> sub TI,
+          do -- a padded (possibly negative) decimal literal
+            n <- Gen.integral (Range.linearFrom 0 (-999) 999)
+            pre <- Gen.string (Range.linear 0 2) (Gen.element (" \t\n" :: String))
+            post <- Gen.string (Range.linear 0 2) (Gen.element (" \t\n" :: String))
+            pure (GCall "Str.parse" [GS (pre ++ show n ++ post)]),
           do -- charAt returns the 1-based character CODE
             str' <- Gen.string (Range.linear 1 8) (Gen.element ['a' .. 'z'])
             k <- Gen.integral (Range.linear 1 (length str'))
@@ -651,6 +665,86 @@ prop_dollar_swallows_pipe = withTests 150 . property $ do
     (Right t1, Right t2) -> show t1 === show t2
     (a, b') -> annotate (show (a, b')) >> failure
 
+-- 6. parseInt agrees with the decimal-only model on accepted AND rejected
+-- input: where the model refuses, the VM must panic rather than invent a
+-- number (hex, parens, '+', embedded spaces, bare '-').
+prop_parse_int_model :: Property
+prop_parse_int_model = withTests 200 . property $ do
+  s <-
+    forAll $
+      Gen.choice
+        [ do
+            n <- Gen.integral (Range.linearFrom 0 (-99999) 99999 :: Range Integer)
+            pre <- Gen.string (Range.linear 0 2) (Gen.element (" \t\n" :: String))
+            post <- Gen.string (Range.linear 0 2) (Gen.element (" \t\n" :: String))
+            pure (pre ++ show n ++ post),
+          Gen.element ["", " ", "-", "--1", "+3", "0x1F", "(5)", "1a", "1 2", "- 4", "12.5", "1e3"],
+          Gen.string (Range.linear 0 5) (Gen.element ("0123456789 -+x()" :: String))
+        ]
+  out <- evalIO (runSol ("ptest = Str.parse " ++ show s ++ ".\n"))
+  case rprim "Str.parse" [RS s] of
+    Right rv -> out === Right (rvRender rv)
+    Left _ -> case out of
+      Left _ -> success
+      Right v -> annotate ("accepted " ++ show s ++ " as " ++ v) >> failure
+
+-- 7. Parser regressions: fixed sources pinned to the exact AST they must
+-- produce, one group per parser path whose backtracking was restructured.
+parserCases :: [(String, [STop])]
+parserCases =
+  [ -- block statements
+    ("ptest = (<+>) a b = a + b; 1.", [bind (SBlock [SBind "<+>" ["a", "b"] (SBin "+" (v "a") (v "b"))] (SInt 1))]),
+    ("ptest = f x = x; f 1.", [bind (SBlock [SBind "f" ["x"] (v "x")] (SApp (v "f") (SInt 1)))]),
+    ("ptest = (a, b) = p; a.", [bind (SBlock [SBindPat (PTup [PVar "a", PVar "b"]) (v "p")] (v "a"))]),
+    ("ptest = x :: r = xs; x.", [bind (SBlock [SBindPat (PCon "Cons" [PVar "x", PVar "r"]) (v "xs")] (v "x"))]),
+    ("ptest = a.", [bind (v "a")]),
+    ("ptest = a == b.", [bind (SBin "==" (v "a") (v "b"))]),
+    -- upper-case declarations
+    ("T = Type (A | B Int).", [TType "T" False [] [("A", []), ("B", [int])]]),
+    ("H 1 = Type (H Int).", [TType "H" True [] [("H", [int])]]),
+    ("Box a = Type (Box a).", [TType "Box" False ["a"] [("Box", [TVarT "a"])]]),
+    ("N = Type Int.", [TType "N" False [] [("N", [int])]]),
+    ("P = { x : Int, y : Int }.", [TShape "P" [("x", int), ("y", int)]]),
+    ("A = Sig { zero : t }.", [TSigDef "A" [("zero", Just (TVarT "t"))]]),
+    ("S = Struct A { zero = 0 }.", [TStruct "S" ["A"] [("zero", SInt 0)]]),
+    ("T = m.T.", [TConAlias "T" "m.T"]),
+    ("T = U.", [TSkip]),
+    ("Foo : Int -> Int.", [TSig "Foo" ([int], int)]),
+    ("(<+>) : Int -> Int.", [TSig "<+>" ([int], int)]),
+    ("(<+>) a b = a + b.", [TBind "<+>" [PVar "a", PVar "b"] [] (SBin "+" (v "a") (v "b"))]),
+    ("> print 1.", [TEval (SApp (v "print") (SInt 1))]),
+    -- pipes vs the `|` separator
+    ("ptest = a |> f |> g.", [bind (SBin "|>" (SBin "|>" (v "a") (v "f")) (v "g"))]),
+    ("ptest = a |>? f.", [bind (SBin "|>?" (v "a") (v "f"))]),
+    ("ptest = f >> g.", [bind (SBin ">>" (v "f") (v "g"))]),
+    ("ptest = case x of 1 -> a |> f | _ -> b.", [bind (SCase (v "x") [(PInt 1, SBin "|>" (v "a") (v "f")), (PWild, v "b")])]),
+    ("f x | x > 0 = x |> g.", [TBind "f" [PVar "x"] [GBool (SBin ">" (v "x") (SInt 0))] (SBin "|>" (v "x") (v "g"))]),
+    ("ptest = { r | a = 1 }.", [bind (SUpd (v "r") [(["a"], SInt 1)])]),
+    -- comparison operators, spaced and unspaced
+    ("ptest = a < b.", [bind (SBin "<" (v "a") (v "b"))]),
+    ("ptest = a<=b.", [bind (SBin "<=" (v "a") (v "b"))]),
+    ("ptest = a > b.", [bind (SBin ">" (v "a") (v "b"))]),
+    ("ptest = a>=b.", [bind (SBin ">=" (v "a") (v "b"))]),
+    ("ptest = a != b.", [bind (SBin "!=" (v "a") (v "b"))]),
+    ("ptest = a ! 1 == b.", [bind (SBin "==" (SBin "!" (v "a") (SInt 1)) (v "b"))]),
+    -- string literals
+    ("ptest = \"\".", [bind (SStrI [])]),
+    ("ptest = \"a\\nb\\tc.\".", [bind (SStrI [SegStr "a\nb\tc."])]),
+    ("ptest = \"q\\\"x\\\"y\".", [bind (SStrI [SegStr "q\"x\"y"])]),
+    ("ptest = \"\\{lit\\} \\\\\".", [bind (SStrI [SegStr "{lit} \\"])]),
+    ("ptest = \"x{a}y\".", [bind (SStrI [SegStr "x", SegExpr (v "a"), SegStr "y"])])
+  ]
+  where
+    bind = TBind "ptest" [] []
+    v = SVar
+    int = TCon "Int" []
+
+prop_parser_cases :: Property
+prop_parser_cases = withTests 1 . property $
+  forM_ parserCases $ \(src, want) -> do
+    annotate src
+    fmap show (parseSol src) === Right (show want)
+
 main :: IO ()
 main = do
   hSetBuffering stdout LineBuffering >> setLocaleEncoding utf8
@@ -662,6 +756,8 @@ main = do
           ("$ == parens (AST identity)", prop_dollar_paren_same_ast),
           ("|> is application", prop_pipe_is_application),
           ("interpolation == str", prop_interp_is_str),
-          ("$ swallows |> (precedence)", prop_dollar_swallows_pipe)
+          ("$ swallows |> (precedence)", prop_dollar_swallows_pipe),
+          ("parseInt == decimal model", prop_parse_int_model),
+          ("parser regression cases (AST-pinned)", prop_parser_cases)
         ]
   unless ok exitFailure
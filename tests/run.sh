@@ -19,14 +19,23 @@ else
 fi
 
 echo "--- composition programs ---"
+# the programs are independent processes (each writes only its own /tmp file
+# and its own .soldata/.soljournal), so start them all at once and report in
+# file order: wall time is the slowest program, not the sum
+outs=$(mktemp -d)
 for f in tests/compose/c*.sol; do
-  out=$(./sol "$f" 2>&1)
+  ./sol "$f" > "$outs/$(basename "$f").out" 2>&1 &
+done
+wait
+for f in tests/compose/c*.sol; do
+  out=$(cat "$outs/$(basename "$f").out")
   if echo "$out" | grep -qE "FAIL|ERRORS|PANIC|error:"; then
     echo "FAIL $f"; echo "$out" | head -5; fail=1
   else
     echo "ok   $f ($(echo "$out" | grep -c '^ok ') checks)"
   fi
 done
+rm -rf "$outs"
 
 echo "--- negative tests ---"
 tests/compose/c9_neg_linearity.sh || fail=1